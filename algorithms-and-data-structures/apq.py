@@ -85,6 +85,13 @@ class HeapAPQ:
     def length(self):
         """ Return the number of items in the heap. """
         return self._size
+
+    def clear(self):
+        """ Remove all elements from the heap. """
+        for elt in self._heap:
+            elt._wipe()
+        self._heap.clear()
+        self._size = 0
     
     #Methods for Adaptable Priority Queue ADT
 
@@ -0,0 +1,196 @@
+#Precomputed shortest path tables for frequently used sources
+#
+#Usage:
+#  python distance_table.py --graph simplegraph1-2.txt --sources 1 4 --output depots.table
+#  python distance_table.py --grid 250 --seed 0 --sources "(0, 0)" "(125, 125)" --output hubs.table
+#
+#For each source the full shortest path tree is computed once with dijkstra_heap_v1 and written to
+#disk as two arrays indexed by vertex number (the position of the vertex in graph.vertices()): the
+#cost of the shortest path and the number of the predecessor on it. The file records a checksum of
+#the graph, so a table is only ever used with the graph it was built from. Loaded tables are
+#memory-mapped, so a lookup reads a single entry and paths are unpacked only when asked for.
+
+import argparse
+import hashlib
+import mmap
+import struct
+import sys
+from array import array
+
+MAGIC = b"DISTTBL\0"
+VERSION = 1
+
+#magic, version, byte order, cost type code, number of sources, number of vertices, graph checksum
+#(padded to 64 bytes so that the arrays that follow are aligned)
+HEADER = struct.Struct("<8sIcc2xIQ32s4x")
+
+def graph_checksum(graph):
+    """ Return a SHA-256 digest of the vertices, edges and weights of graph, in vertex order. """
+    vertices = graph.vertices()
+    index = {v: i for i, v in enumerate(vertices)}
+    digest = hashlib.sha256()
+    for i, v in enumerate(vertices):
+        digest.update(repr(v.element()).encode())
+        digest.update(b"\0")
+        for e in graph.get_edges(v):
+            digest.update(b"%d:%s;" % (index[e.opposite(v)], repr(e.weight()).encode()))
+        digest.update(b"\n")
+    return digest.digest()
+
+def write_table(graph, sources, filename):
+    """ Compute the shortest path trees from each vertex in sources and write them to filename. """
+    vertices = graph.vertices()
+    index = {v: i for i, v in enumerate(vertices)}
+    n = len(vertices)
+
+    integral = all(isinstance(e.weight(), int) for e in graph.edges())
+    typecode = 'q' if integral else 'd'
+    unreachable = -1 if integral else float("inf")
+
+    with open(filename, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, sys.byteorder[0].encode(), typecode.encode(),
+                               len(sources), n, graph_checksum(graph)))
+        array('q', [index[src] for src in sources]).tofile(file)
+
+        for src in sources:
+            closed = graph.dijkstra_heap_v1(src, None)
+            costs = array(typecode, [unreachable]) * n
+            preds = array('q', [-1]) * n
+            for v, (cost, pred) in closed.items():
+                i = index[v]
+                costs[i] = cost
+                if pred is not None:
+                    preds[i] = index[pred]
+            costs.tofile(file)
+            preds.tofile(file)
+
+class DistanceTable:
+    """ A memory-mapped table of shortest path trees written by write_table. """
+
+    def __init__(self, filename, graph):
+        """ Open the table in filename for use with graph.
+
+        Raises ValueError if the file is not a table of a supported version or was built from a
+        different graph.
+        """
+        self._file = open(filename, 'rb')
+        self._map = None
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._open(graph)
+        except Exception:
+            #e.g. an empty file cannot be mapped; don't leave the file open
+            self.close()
+            raise
+
+    def _open(self, graph):
+        magic, version, byteorder, typecode, num_sources, n, checksum = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError("not a distance table")
+        if version != VERSION:
+            raise ValueError("unsupported distance table version %d" % version)
+        if byteorder != sys.byteorder[0].encode():
+            raise ValueError("distance table was written on a machine with a different byte order")
+        if len(self._map) != HEADER.size + 8 * num_sources + 16 * num_sources * n:
+            raise ValueError("distance table is truncated or has trailing data")
+        if checksum != graph_checksum(graph):
+            raise ValueError("distance table was built from a different graph")
+
+        self._vertices = graph.vertices()
+        self._index = {v: i for i, v in enumerate(self._vertices)}
+        self._n = n
+        self._integral = typecode == b'q'
+
+        offset = HEADER.size
+        sources = memoryview(self._map)[offset : offset + 8 * num_sources].cast('q')
+        #row[i] is the position of source i's tree in the table
+        self._rows = {self._vertices[s]: row for row, s in enumerate(sources)}
+        sources.release()
+
+        offset += 8 * num_sources
+        self._body = memoryview(self._map)[offset:]
+        self._costs = self._body.cast(typecode.decode())
+        self._preds = self._body.cast('q')
+
+    def close(self):
+        """ Release the memory map and close the file. """
+        for name in ("_costs", "_preds", "_body"):
+            if hasattr(self, name):
+                getattr(self, name).release()
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def sources(self):
+        """ Return a list of the source vertices in the table. """
+        return list(self._rows)
+
+    def has_source(self, src):
+        """ Return True if the table holds the shortest path tree from src. """
+        return src in self._rows
+
+    def cost(self, src, dest):
+        """ Return the shortest path cost from src to dest, or None if dest is unreachable. """
+        row = self._rows[src]
+        cost = self._costs[2 * row * self._n + self._index[dest]]
+        if self._integral:
+            return cost if cost != -1 else None
+        return cost if cost != float("inf") else None
+
+    def pred(self, src, v):
+        """ Return the predecessor of v on the shortest path from src, or None. """
+        pred = self._preds[(2 * self._rows[src] + 1) * self._n + self._index[v]]
+        return self._vertices[pred] if pred != -1 else None
+
+    def path(self, src, dest):
+        """ Return the list of vertices on the shortest path from src to dest, or None if unreachable. """
+        if self.cost(src, dest) is None:
+            return None
+        offset = (2 * self._rows[src] + 1) * self._n
+        i = self._index[dest]
+        path = []
+        while i != -1:
+            path.append(self._vertices[i])
+            i = self._preds[offset + i]
+        path.reverse()
+        return path
+
+def parse_label(label):
+    """ Return label as an int if it looks like one (as in graph files), otherwise as a string. """
+    try:
+        return int(label)
+    except ValueError:
+        return label
+
+def main(argv=None):
+    from server import load_graph
+
+    parser = argparse.ArgumentParser(description="Precompute shortest path trees for a set of sources.")
+    graph_source = parser.add_mutually_exclusive_group(required=True)
+    graph_source.add_argument("--graph", help="graph file in the format read by evaluation.graphreader")
+    graph_source.add_argument("--grid", type=int, help="use a seeded grid graph of this size")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the grid graph weights")
+    parser.add_argument("--sources", nargs="*", default=[], help="source vertex labels")
+    parser.add_argument("--sources-file", help="file with one source vertex label per line")
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args(argv)
+
+    labels = list(args.sources)
+    if args.sources_file:
+        with open(args.sources_file, 'r') as file:
+            labels += [line.strip() for line in file if line.strip()]
+    if not labels:
+        parser.error("no sources given")
+
+    graph, vertices = load_graph(args.graph, args.grid, args.seed)
+    sources = []
+    for label in labels:
+        if parse_label(label) not in vertices:
+            parser.error("unknown source %r" % label)
+        sources.append(vertices[parse_label(label)])
+
+    write_table(graph, sources, args.output)
+    print("Wrote %d shortest path trees over %d vertices to %s" % (len(sources), graph.num_vertices(), args.output))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+#Seeded random graph generators for scaling studies
+#
+#Each generator returns an EdgeList: the number of vertices and three parallel arrays holding the
+#two endpoints and the weight of every edge, with vertices numbered 0 to n-1. Weights are drawn in
+#one call for all edges rather than one randint call per edge, and no per-vertex labels are built,
+#so graphs with millions of vertices can be generated quickly. An EdgeList can be converted into a
+#Graph (to_graph) or into compact adjacency arrays (adjacency).
+#
+#The same seed always gives the same graph.
+
+from array import array
+from math import floor, log, pi, sqrt
+from random import Random
+from time import perf_counter
+
+from graph import Graph
+
+class EdgeList:
+    """ An undirected graph on vertices 0..n-1, stored as parallel arrays of edge endpoints and weights. """
+
+    def __init__(self, n, sources, targets, weights):
+        self.n = n
+        self.sources = sources
+        self.targets = targets
+        self.weights = weights
+
+    def num_vertices(self):
+        """ Return the number of vertices. """
+        return self.n
+
+    def num_edges(self):
+        """ Return the number of edges. """
+        return len(self.sources)
+
+    def to_graph(self):
+        """ Return a Graph of the edges, and a list of its vertices indexed by vertex number.
+
+        Each vertex's element is its number.
+        """
+        g = Graph()
+        vertices = [g.add_vertex(i) for i in range(self.n)]
+        for u, v, w in zip(self.sources, self.targets, self.weights):
+            g.add_edge(vertices[u], vertices[v], w, None)
+        return g, vertices
+
+    def adjacency(self):
+        """ Return the graph in compressed sparse row form as (offsets, neighbours, weights).
+
+        The neighbours of vertex i, and the weights of the edges to them, are at positions
+        offsets[i] to offsets[i+1]-1. Each edge appears once for each of its endpoints.
+        """
+        degree = array('q', [0]) * (self.n + 1)
+        for u in self.sources:
+            degree[u + 1] += 1
+        for v in self.targets:
+            degree[v + 1] += 1
+        for i in range(self.n):
+            degree[i + 1] += degree[i]
+        offsets = degree
+
+        m = len(self.sources)
+        neighbours = array('q', [0]) * (2 * m)
+        weights = array(self.weights.typecode, [0]) * (2 * m)
+        position = array('q', offsets[:-1])
+        for u, v, w in zip(self.sources, self.targets, self.weights):
+            neighbours[position[u]] = v
+            weights[position[u]] = w
+            position[u] += 1
+            neighbours[position[v]] = u
+            weights[position[v]] = w
+            position[v] += 1
+        return offsets, neighbours, weights
+
+def uniform_weights(rng, count, low, high):
+    """ Return an array of count random integers in [low, high]. """
+    return array('q', rng.choices(range(low, high + 1), k=count))
+
+def grid(n, m, seed=None, low=1, high=None):
+    """ Return an n x m grid graph; vertex (i, j) is numbered i*m + j.
+
+    Weights are integers in [low, high], where high defaults to max(n,m)//2 as in evaluation.grid_graph.
+    """
+    if high is None:
+        high = max(max(n, m) // 2, low)
+    rng = Random(seed)
+    sources = array('q')
+    targets = array('q')
+    for i in range(n):
+        row = i * m
+        #edges to the right
+        sources.extend(range(row, row + m - 1))
+        targets.extend(range(row + 1, row + m))
+        #edges down
+        if i + 1 < n:
+            sources.extend(range(row, row + m))
+            targets.extend(range(row + m, row + 2 * m))
+    return EdgeList(n * m, sources, targets, uniform_weights(rng, len(sources), low, high))
+
+def random_geometric(n, radius=None, seed=None, scale=1000):
+    """ Return a random geometric graph, a simple model of a road network.
+
+    n points are placed uniformly in the unit square and every pair closer than radius is joined,
+    with weight equal to their distance times scale. radius defaults to the value giving an
+    average degree of about 6. Points are bucketed into cells of side radius, so only pairs in
+    neighbouring cells are compared.
+    """
+    if radius is None:
+        radius = sqrt(6 / (pi * max(n, 1)))
+    rng = Random(seed)
+    xs = array('d', [rng.random() for _ in range(n)])
+    ys = array('d', [rng.random() for _ in range(n)])
+
+    cells_per_side = max(1, floor(1 / radius))
+    cell_size = 1 / cells_per_side
+    cells = {}
+    for i in range(n):
+        key = (min(int(xs[i] / cell_size), cells_per_side - 1), min(int(ys[i] / cell_size), cells_per_side - 1))
+        cells.setdefault(key, []).append(i)
+
+    sources = array('q')
+    targets = array('q')
+    weights = array('d')
+    radius_squared = radius * radius
+    for (cx, cy), members in cells.items():
+        #compare with this cell and the four neighbouring cells "after" it, so each pair is seen once
+        for dx, dy in ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1)):
+            others = cells.get((cx + dx, cy + dy))
+            if not others:
+                continue
+            same = dx == 0 and dy == 0
+            for a, i in enumerate(members):
+                xi = xs[i]
+                yi = ys[i]
+                for j in (members[a+1:] if same else others):
+                    dx2 = xi - xs[j]
+                    dy2 = yi - ys[j]
+                    d2 = dx2 * dx2 + dy2 * dy2
+                    if d2 < radius_squared:
+                        sources.append(i)
+                        targets.append(j)
+                        weights.append(sqrt(d2) * scale)
+    return EdgeList(n, sources, targets, weights)
+
+def erdos_renyi(n, p, seed=None, low=1, high=100):
+    """ Return an Erdos-Renyi G(n, p) random graph with integer weights in [low, high].
+
+    Uses the geometric skipping method of Batagelj and Brandes, so the running time is
+    proportional to the number of edges rather than to n^2.
+    """
+    rng = Random(seed)
+    sources = array('q')
+    targets = array('q')
+    if p > 0:
+        if p >= 1:
+            for v in range(1, n):
+                sources.extend(range(v))
+                targets.extend([v] * v)
+        else:
+            log_q = log(1 - p)
+            v = 1
+            w = -1
+            while v < n:
+                w += 1 + int(log(1 - rng.random()) / log_q)
+                while w >= v and v < n:
+                    w -= v
+                    v += 1
+                if v < n:
+                    sources.append(w)
+                    targets.append(v)
+    return EdgeList(n, sources, targets, uniform_weights(rng, len(sources), low, high))
+
+def power_law(n, m=2, seed=None, low=1, high=100):
+    """ Return a Barabasi-Albert preferential attachment graph with integer weights in [low, high].
+
+    Each new vertex is joined to m distinct existing vertices chosen with probability proportional
+    to their degree, giving a power-law degree distribution.
+    """
+    rng = Random(seed)
+    sources = array('q')
+    targets = array('q')
+    #every vertex appears in repeated once per edge end, so choosing from it is degree-proportional
+    repeated = array('q')
+    #start from a star on the first m+1 vertices so every vertex has nonzero degree
+    for v in range(1, min(m + 1, n)):
+        sources.append(0)
+        targets.append(v)
+        repeated.extend((0, v))
+    for v in range(m + 1, n):
+        chosen = set()
+        while len(chosen) < m:
+            chosen.add(repeated[int(rng.random() * len(repeated))])
+        for u in chosen:
+            sources.append(u)
+            targets.append(v)
+            repeated.extend((u, v))
+    return EdgeList(n, sources, targets, uniform_weights(rng, len(sources), low, high))
+
+if __name__ == "__main__":
+    for name, make in (("Grid 1000x1000", lambda: grid(1000, 1000, seed=0)),
+                       ("Random geometric", lambda: random_geometric(1000000, seed=0)),
+                       ("Erdos-Renyi", lambda: erdos_renyi(1000000, 4 / 1000000, seed=0)),
+                       ("Power law", lambda: power_law(1000000, 2, seed=0))):
+        start = perf_counter()
+        edges = make()
+        end = perf_counter()
+        print("%s: Vertices: %d, Edges: %d, Time: %0.3f" % (name, edges.num_vertices(), edges.num_edges(), end - start))
@@ -1,5 +1,7 @@
 #The following Python files are required to run the evaluations: apq.py, graph.py, evaluation.py
 from apq import *
+from math import log, sqrt
+from time import perf_counter
 
 class Vertex:
     """ A Vertex in a graph. """
@@ -103,6 +105,11 @@ class Graph:
     def __init__(self):
         """ Create an initial empty graph. """
         self._structure = dict()
+        self._tables = []
+        self._profile = None        #cached by profile(), cleared when the graph changes
+        self._calibrated = {}       #engine chosen by calibration, keyed by whether there is a dest
+        self._last_engine = None
+        self._version = 0           #incremented whenever a vertex or edge is added
 
     def __str__(self):
         """ Return a string representation of the graph. """
@@ -203,6 +210,7 @@ class Graph:
         """
         v = Vertex(element)
         self._structure[v] = dict()  # create an empty dict, ready for edges
+        self._changed()
         return v
 
     def add_vertex_if_new(self, element):
@@ -249,6 +257,7 @@ class Graph:
         # etc.
         self._structure[v][w] = e  
         self._structure[w][v] = e
+        self._changed()
         return e
 
     def add_edge_pairs(self, elist):
@@ -269,6 +278,145 @@ class Graph:
         return hdv            
 
     
+    def _changed(self):
+        """ Forget everything cached about the shape of the graph, including loaded distance tables. """
+        self._version += 1
+        self._profile = None
+        self._calibrated = {}
+        for table in self._tables:
+            table.close()
+        self._tables = []
+
+    def load_distance_table(self, filename):
+        """ Load and return the precomputed DistanceTable in filename (see distance_table.py).
+
+        Raises ValueError if the table was built from a different graph. The table is closed
+        and forgotten if a vertex or edge is added to the graph.
+        """
+        from distance_table import DistanceTable
+
+        table = DistanceTable(filename, self)
+        self._tables.append(table)
+        return table
+
+    def distance_table(self, src):
+        """ Return a loaded DistanceTable holding the shortest path tree from src, or None. """
+        for table in self._tables:
+            if table.has_source(src):
+                return table
+        return None
+
+    def workspace(self):
+        """ Return a DijkstraWorkspace for running repeated queries on this graph. """
+        return DijkstraWorkspace(self)
+
+    #--------------------------------------------------#
+    #Choosing a Dijkstra implementation
+
+    #dijkstra_dial costs about one step per vertex and edge plus one step per integer cost up to the
+    #largest distance from the source, and an empty bucket is much cheaper than a heap operation.
+    #choose_engine uses dial when the estimated distance range is at most DIAL_STEPS_PER_EDGE times
+    #V+E. Measured with full searches on seeded grids, paths and Erdos-Renyi graphs, dial was faster
+    #while the range was up to about 10 times V+E (30x30 grid, weights up to 1000: dial 2.9 ms, heap
+    #4.4 ms) and slower beyond it (6x6 grid, weights up to 1000: dial 0.34 ms, heap 0.13 ms; 50 vertex
+    #path of weight 1000: dial 1.5 ms, heap 0.11 ms; 100x100 grid, weights up to 10000: level at 66 ms).
+    #The estimate (see estimated_distance_range) is about twice the real range on grids, hence 16.
+    #The list APQ was never clearly faster than the heap (e.g. 1000 vertices of degree 99: list 192 ms,
+    #heap 121 ms), so it is only chosen by calibrate().
+    DIAL_STEPS_PER_EDGE = 16
+
+    def profile(self):
+        """ Return a dict describing the size, density and weight domain of the graph. """
+        if self._profile is None:
+            weights = [e.weight() for e in self.edges()]
+            n = self.num_vertices()
+            self._profile = {"vertices": n,
+                             "edges": len(weights),
+                             "average_degree": 2 * len(weights) / n if n else 0,
+                             "integer_weights": all(isinstance(w, int) for w in weights),
+                             "min_weight": min(weights, default=0),
+                             "max_weight": max(weights, default=0)}
+        return self._profile
+
+    def estimated_distance_range(self):
+        """ Return an upper estimate of the largest shortest path cost from a vertex, from profile().
+
+        The number of edges on a shortest path is taken as sqrt(V) for sparse graphs such as grids and
+        road networks, and as log(V) / log(average degree) + 1 for denser graphs, where paths are short.
+        """
+        profile = self.profile()
+        n = profile["vertices"]
+        degree = profile["average_degree"]
+        if n < 2:
+            return 0
+        if degree < 8:
+            hops = sqrt(n)
+        else:
+            hops = log(n) / log(degree) + 1
+        return profile["max_weight"] * (hops + 1)
+
+    def engines(self):
+        """ Return a dict of the Dijkstra implementations by name, each called as engine(src, dest). """
+        return {"list": self.dijkstra_list,
+                "heap": self.dijkstra_heap_v1,
+                "heap_early_exit": self.dijkstra_heap_v2,
+                "lazy_heap": self.dijkstra_heap_q6,
+                "dial": lambda src, dest: self.dijkstra_dial(src, dest, self.profile()["max_weight"])}
+
+    def choose_engine(self, dest=None):
+        """ Return the name of the engine shortest_path would use, based on profile(). """
+        if (dest is not None) in self._calibrated:
+            return self._calibrated[dest is not None]
+        profile = self.profile()
+        if (profile["integer_weights"] and profile["min_weight"] >= 0
+                and self.estimated_distance_range() <= self.DIAL_STEPS_PER_EDGE * (profile["vertices"] + profile["edges"])):
+            return "dial"
+        if dest is not None:
+            return "heap_early_exit"
+        return "heap"
+
+    def calibrate(self, src, dest=None):
+        """ Time every suitable engine on one query, and use the fastest for later queries of the same kind.
+
+        Return the name of the engine chosen.
+        """
+        profile = self.profile()
+        names = ["heap_early_exit" if dest is not None else "heap", "lazy_heap"]
+        if profile["vertices"] <= 4096:
+            #the list APQ is quadratic in the number of vertices, so is only worth trying on small graphs
+            names.append("list")
+        if (profile["integer_weights"] and profile["min_weight"] >= 0
+                and self.estimated_distance_range() <= 10 * self.DIAL_STEPS_PER_EDGE * (profile["vertices"] + profile["edges"])):
+            #worth timing a little past the point where choose_engine gives up on it, but not where it is hopeless
+            names.append("dial")
+
+        engines = self.engines()
+        times = {}
+        for name in names:
+            start = perf_counter()
+            engines[name](src, dest)
+            times[name] = perf_counter() - start
+
+        self._calibrated[dest is not None] = min(times, key=times.get)
+        return self._calibrated[dest is not None]
+
+    def shortest_path(self, src, dest=None, calibrate=False):
+        """ Find shortest paths from src with the engine best suited to this graph.
+
+        Returns the same (cost, pred) dict as the implementations below. If dest is given, the
+        search may stop once dest is settled. If calibrate is True and the graph has not been
+        calibrated for this kind of query, the engines are timed on this query first (see calibrate).
+        The engine used is available from last_engine().
+        """
+        if calibrate and (dest is not None) not in self._calibrated:
+            self.calibrate(src, dest)
+        self._last_engine = self.choose_engine(dest)
+        return self.engines()[self._last_engine](src, dest)
+
+    def last_engine(self):
+        """ Return the name of the engine used by the last call to shortest_path. """
+        return self._last_engine
+
     #Dijkstra implementations
 
     def dijkstra_heap_v1(self, src, dest):
@@ -300,6 +448,37 @@ class Graph:
         
         return closed
 
+    #Lazy version of dijkstra_heap_v1 - yields (vertex, cost, pred) as each vertex is settled, in order of cost
+    #The queue is kept between yields, so the caller can stop the search at any point
+    def dijkstra_iter(self, src):
+        open = HeapAPQ()
+        closed = {}
+        locs = {}
+        preds = {src: None}
+
+        locs[src] = open.add(0, src)
+
+        while open.length() > 0:
+            vcost, v = open.remove_min()
+
+            pred = preds.pop(v)
+            locs.pop(v)
+
+            closed[v] = (vcost, pred)
+
+            yield v, vcost, pred
+
+            for e in self.get_edges(v):
+                w = e.opposite(v)
+                if w not in closed:
+                    newcost = vcost + e.weight()
+                    if w not in locs:
+                        preds[w] = v
+                        locs[w] = open.add(newcost, w)
+                    elif newcost < locs[w].key():
+                        preds[w] = v
+                        open.update_key(locs[w], newcost)
+
     #Adapted to break out of the loop and return closed if the node removed from the heap is the destination
     def dijkstra_heap_v2(self, src, dest):
         open = HeapAPQ()
@@ -363,6 +542,144 @@ class Graph:
         
         return closed
     
+    #Bucket queue (Dial's algorithm) for non-negative integer weights no larger than max_weight
+    #Every open cost lies within max_weight of the cost being settled, so max_weight+1 buckets are reused circularly
+    #Like dijkstra_heap_q6 a vertex may be added more than once, and the stale entries are skipped
+    def dijkstra_dial(self, src, dest, max_weight=None):
+        if max_weight is None:
+            max_weight = max((e.weight() for e in self.edges()), default=0)
+        num_buckets = max_weight + 1
+        buckets = [[] for _ in range(num_buckets)]
+        closed = {}
+        best = {src: 0}
+
+        buckets[0].append((src, None))
+        count = 1
+        cost = 0
+
+        while count > 0:
+            bucket = buckets[cost % num_buckets]
+            while bucket:
+                v, pred = bucket.pop()
+                count -= 1
+                if v in closed or best[v] != cost:
+                    continue
+                closed[v] = (cost, pred)
+
+                if v is dest:
+                    return closed
+
+                for e in self.get_edges(v):
+                    w = e.opposite(v)
+                    if w not in closed:
+                        newcost = cost + e.weight()
+                        if w not in best or newcost < best[w]:
+                            best[w] = newcost
+                            buckets[newcost % num_buckets].append((w, v))
+                            count += 1
+            cost += 1
+
+        return closed
+
+    #K shortest loopless paths (Yen's algorithm)
+    #Returns a list of up to k (cost, path) pairs in order of cost, where path is a list of vertices from src to dest
+    #A single shortest path tree towards dest is built with dijkstra_heap_v1 and reused for every spur search:
+    #  - if the tree path from the spur vertex avoids the root path and the removed edges, it is the spur path
+    #  - otherwise an A* search is run, using the tree costs (exact distances before any edges are removed) as the heuristic
+    #Spur vertices before the point where a path left its parent were already tried from the parent (Lawler), so are skipped
+    def k_shortest_paths(self, src, dest, k):
+        tree = self.dijkstra_heap_v1(dest, None)
+        if src not in tree or k < 1:
+            return []
+
+        first = self._tree_path(tree, src)
+        found = [(tree[src][0], first)]
+        deviation = 0
+        seen = {tuple(first)}
+        candidates = HeapAPQ()
+
+        while len(found) < k:
+            prev = found[-1][1]
+
+            root_cost = 0
+            for i in range(deviation):
+                root_cost += self.get_edge(prev[i], prev[i+1]).weight()
+
+            for i in range(deviation, len(prev) - 1):
+                spur = prev[i]
+                root = prev[:i+1]
+                blocked = set(root[:-1])
+
+                #remove the next edge of every path found so far that shares this root
+                removed = set()
+                for _, path in found:
+                    if len(path) > i + 1 and path[:i+1] == root:
+                        removed.add(path[i+1])
+
+                spur_cost, spur_path = self._spur_path(tree, spur, dest, blocked, removed)
+                if spur_path is not None:
+                    path = root[:-1] + spur_path
+                    if tuple(path) not in seen:
+                        seen.add(tuple(path))
+                        candidates.add(root_cost + spur_cost, (path, i))
+
+                root_cost += self.get_edge(spur, prev[i+1]).weight()
+
+            if candidates.length() == 0:
+                break
+            cost, (path, deviation) = candidates.remove_min()
+            found.append((cost, path))
+
+        return found
+
+    def _tree_path(self, tree, v):
+        """ Return the path from v to the root of the shortest path tree. """
+        path = [v]
+        while tree[v][1] is not None:
+            v = tree[v][1]
+            path.append(v)
+        return path
+
+    def _spur_path(self, tree, spur, dest, blocked, removed):
+        """ Return (cost, path) of the shortest path from spur to dest avoiding blocked vertices and the edges from spur to removed.
+
+        tree is the shortest path tree towards dest. Returns (None, None) if there is no such path.
+        """
+        #the tree path is the shortest path with no restrictions, so it is optimal if it is still allowed
+        path = self._tree_path(tree, spur)
+        if (len(path) < 2 or path[1] not in removed) and blocked.isdisjoint(path):
+            return tree[spur][0], path
+
+        #A* search, lazy insertion as in dijkstra_heap_q6
+        #keys are (estimated total cost, -cost so far) so that ties are broken towards dest
+        open = HeapAPQ()
+        closed = {}
+        open.add((tree[spur][0], 0), (spur, 0, None))
+
+        while open.length() > 0:
+            _, (v, vcost, pred) = open.remove_min()
+            if v in closed:
+                continue
+            closed[v] = (vcost, pred)
+
+            if v is dest:
+                path = [dest]
+                while closed[path[-1]][1] is not None:
+                    path.append(closed[path[-1]][1])
+                path.reverse()
+                return vcost, path
+
+            for e in self.get_edges(v):
+                w = e.opposite(v)
+                if w in closed or w in blocked or w not in tree:
+                    continue
+                if v is spur and w in removed:
+                    continue
+                newcost = vcost + e.weight()
+                open.add((newcost + tree[w][0], -newcost), (w, newcost, v))
+
+        return None, None
+
     #Q6 - Simpler Priority Queue
     def dijkstra_heap_q6(self, src, dest):
         open = HeapAPQ()
@@ -382,4 +699,115 @@ class Graph:
                         newcost = vcost + e.weight()
                         open.add(newcost, (w, v))
         
-        return closed
\ No newline at end of file
+        return closed
+
+
+class DijkstraWorkspace:
+    """ Reusable state for running many Dijkstra queries on one graph.
+
+    The cost, predecessor and queue location of each vertex are kept in lists indexed by vertex
+    number, allocated once. Each query starts a new epoch, and an entry only counts as set if its
+    stamp matches the current epoch, so nothing needs to be cleared between queries and a query
+    only touches the vertices it reaches.
+
+    The vertex numbering and adjacency lists are taken from the graph when the workspace is created,
+    so a new workspace must be created if the graph is modified; query() raises ValueError otherwise.
+    """
+
+    def __init__(self, graph):
+        """ Create a workspace for graph. """
+        self._graph = graph
+        self._version = graph._version
+        self._vertices = graph.vertices()
+        self._index = {v: i for i, v in enumerate(self._vertices)}
+        #adjacency[i] is a list of (neighbour number, edge weight) pairs for vertex i
+        self._adjacency = [[(self._index[e.opposite(v)], e.weight()) for e in graph.get_edges(v)]
+                           for v in self._vertices]
+
+        n = len(self._vertices)
+        self._cost = [0] * n
+        self._pred = [-1] * n
+        self._locs = [None] * n
+        self._seen = [0] * n        #epoch in which the vertex was last reached
+        self._closed = [0] * n      #epoch in which the vertex was last settled
+        self._epoch = 0
+        self._open = HeapAPQ()
+
+    def query(self, src, dest=None):
+        """ Run Dijkstra from src, stopping once dest is settled (or running to completion if dest is None).
+
+        Return the cost of the shortest path to dest, or None if there is no dest or it is unreachable.
+        The results stay available through cost() and path() until the next query.
+        Raises ValueError if a vertex or edge has been added to the graph since the workspace was created.
+        """
+        if self._graph._version != self._version:
+            raise ValueError("the graph has changed since this workspace was created")
+        self._open.clear()
+        self._epoch += 1
+        epoch = self._epoch
+        cost = self._cost
+        pred = self._pred
+        locs = self._locs
+        seen = self._seen
+        closed = self._closed
+        adjacency = self._adjacency
+        open = self._open
+
+        s = self._index[src]
+        t = self._index[dest] if dest is not None else -1
+
+        seen[s] = epoch
+        cost[s] = 0
+        pred[s] = -1
+        locs[s] = open.add(0, s)
+
+        while open.length() > 0:
+            vcost, v = open.remove_min()
+            closed[v] = epoch
+
+            if v == t:
+                return vcost
+
+            for w, weight in adjacency[v]:
+                if closed[w] != epoch:
+                    newcost = vcost + weight
+                    if seen[w] != epoch:
+                        seen[w] = epoch
+                        cost[w] = newcost
+                        pred[w] = v
+                        locs[w] = open.add(newcost, w)
+                    elif newcost < cost[w]:
+                        cost[w] = newcost
+                        pred[w] = v
+                        open.update_key(locs[w], newcost)
+
+        return None
+
+    def cost(self, v):
+        """ Return the shortest path cost to v found by the last query, or None if v was not settled. """
+        i = self._index[v]
+        if self._closed[i] != self._epoch:
+            return None
+        return self._cost[i]
+
+    def path(self, v):
+        """ Return the list of vertices on the shortest path to v found by the last query, or None. """
+        i = self._index[v]
+        if self._closed[i] != self._epoch:
+            return None
+        path = []
+        while i != -1:
+            path.append(self._vertices[i])
+            i = self._pred[i]
+        path.reverse()
+        return path
+
+    def closed(self):
+        """ Return the vertices settled by the last query in the same form as Graph.dijkstra_heap_v1. """
+        epoch = self._epoch
+        results = {}
+        for i, v in enumerate(self._vertices):
+            if self._closed[i] == epoch:
+                pred = self._pred[i]
+                results[v] = (self._cost[i], self._vertices[pred] if pred != -1 else None)
+        return results
@@ -0,0 +1,88 @@
+#Load generator for server.py
+#
+#Usage:
+#  python loadgen.py --port 8765 --requests 2000 --concurrency 32 --sources 8
+#
+#Opens --concurrency connections, each of which sends point-to-point queries one at a time, and
+#reports throughput and latency percentiles. Sources are drawn from a small set of --sources hot
+#vertices (as with depots or hubs) so that concurrent requests can be batched by the server.
+
+import argparse
+import asyncio
+import json
+import random
+from statistics import mean
+from time import perf_counter
+
+async def connect(args):
+    if args.unix:
+        return await asyncio.open_unix_connection(args.unix)
+    return await asyncio.open_connection(args.host, args.port)
+
+async def call(reader, writer, request):
+    writer.write((json.dumps(request) + "\n").encode())
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+def percentile(ordered, p):
+    """ Return the p-th percentile of the sorted list ordered. """
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def client(args, queries, latencies, errors):
+    reader, writer = await connect(args)
+    try:
+        while queries:
+            source, dest = queries.pop()
+            start = perf_counter()
+            response = await call(reader, writer, {"id": len(queries), "source": source, "dest": dest})
+            latencies.append(perf_counter() - start)
+            if "error" in response or "error" in response["results"][0]:
+                errors.append(response)
+    finally:
+        writer.close()
+
+async def run(args):
+    reader, writer = await connect(args)
+    labels = (await call(reader, writer, {"op": "sample", "count": args.sources + args.dests, "seed": args.seed}))["labels"]
+    before = await call(reader, writer, {"op": "stats"})
+    sources = labels[:args.sources]
+    dests = labels[args.sources:]
+
+    rng = random.Random(args.seed)
+    queries = [(rng.choice(sources), rng.choice(dests)) for _ in range(args.requests)]
+    latencies = []
+    errors = []
+
+    start = perf_counter()
+    await asyncio.gather(*[client(args, queries, latencies, errors) for _ in range(args.concurrency)])
+    elapsed = perf_counter() - start
+
+    after = await call(reader, writer, {"op": "stats"})
+    writer.close()
+
+    latencies.sort()
+    searches = after["searches"] - before["searches"]
+    print("Requests: %d, Errors: %d, Searches: %d, Elapsed: %0.3f s, Throughput: %0.1f req/s"
+          % (len(latencies), len(errors), searches, elapsed, len(latencies) / elapsed))
+    print("Latency (ms): Mean: %0.2f, p50: %0.2f, p90: %0.2f, p99: %0.2f, Max: %0.2f"
+          % (mean(latencies) * 1000, percentile(latencies, 50) * 1000, percentile(latencies, 90) * 1000,
+             percentile(latencies, 99) * 1000, latencies[-1] * 1000))
+    if errors:
+        print("First error: %s" % errors[0])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate load against server.py and report latency and throughput.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="connect to this Unix socket path instead of TCP")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--sources", type=int, default=8, help="number of distinct source vertices")
+    parser.add_argument("--dests", type=int, default=100, help="number of distinct destination vertices")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#Parallel runner for the evaluation experiments
+#
+#Usage:
+#  python runner.py q3 q6 --jobs 8 --pin --output results.json
+#  python runner.py q5 --trials 3 --sizes 10 50 100
+#
+#Runs the same experiments as evaluation.q3 - q6, but every trial (one graph and every Dijkstra
+#implementation being compared on it) runs in a fresh worker process, so no trial inherits the
+#heap of an earlier one, and up to --jobs trials run at once. With --pin each worker is pinned to
+#its own CPU for the duration of its trial. Graphs are built with generators.grid from a seed
+#derived from --seed and the trial, so a run can be repeated exactly.
+#
+#More jobs finish sooner but are not free: a trial holds its whole graph in memory (about 1 KB per
+#vertex, so roughly 0.9 GB for a 1000x1000 grid) and concurrent trials compete for memory bandwidth,
+#which slows each of them down and inflates the runtimes being measured. By default at most
+#DEFAULT_JOBS trials run at once, fewer if the available memory cannot hold that many of the largest
+#graph. Raise --jobs for throughput, or use --jobs 1 when the runtimes must be as clean as possible.
+
+import argparse
+import gc
+import json
+import os
+from multiprocessing import Manager, Pool
+from statistics import mean, stdev
+from time import perf_counter
+
+from generators import grid
+
+DEFAULT_JOBS = 4
+
+#Peak resident memory of a trial per grid vertex (84 MB measured for a 300x300 grid)
+BYTES_PER_VERTEX = 1000
+
+#Each experiment has a list of parameters (grid sizes, or destinations for q4), the engines being
+#compared, and a function giving (size, source, dest) as (row, column) pairs for a parameter.
+EXPERIMENTS = {
+    "q3": {"params": (10, 50, 100, 250, 500, 750, 1000),
+           "engines": ("dijkstra_heap_v1",),
+           "query": lambda size: (size, (size//2, size//2), (0, 0))},
+    "q4": {"params": (275, 300, 350, 400, 450, 475, 499),
+           "engines": ("dijkstra_heap_v1", "dijkstra_heap_v2"),
+           "query": lambda dest: (500, (250, 250), (dest, dest))},
+    "q5": {"params": (10, 50, 100, 250, 500),
+           "engines": ("dijkstra_heap_v1", "dijkstra_list"),
+           "query": lambda size: (size, (size//2, size//2), (0, 0))},
+    "q6": {"params": (10, 50, 100, 250, 500, 750, 1000),
+           "engines": ("dijkstra_heap_v1", "dijkstra_heap_q6"),
+           "query": lambda size: (size, (size//2, size//2), (0, 0))},
+}
+
+def trial_seed(seed, experiment, param, index):
+    """ Return the seed for one trial, so that every trial gets a different but repeatable graph. """
+    return ((seed * 1000003 + sorted(EXPERIMENTS).index(experiment)) * 1000003 + param) * 1000003 + index
+
+def available_memory():
+    """ Return the memory available for new processes in bytes, or None if it cannot be found. """
+    try:
+        with open("/proc/meminfo", 'r') as file:
+            for line in file:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError):
+        return None
+
+def default_jobs(largest_size):
+    """ Return how many trials to run at once when --jobs is not given.
+
+    This is DEFAULT_JOBS, limited by the number of usable CPUs and by how many trials on a
+    largest_size x largest_size grid fit in the available memory.
+    """
+    jobs = min(DEFAULT_JOBS, len(os.sched_getaffinity(0)))
+    memory = available_memory()
+    if memory is not None:
+        jobs = min(jobs, memory // (BYTES_PER_VERTEX * largest_size * largest_size))
+    return max(1, jobs)
+
+def run_trial(experiment, param, index, seed, cpus=None):
+    """ Build the graph for one trial and time each engine of the experiment on it.
+
+    Return (experiment, param, {engine: (runtime, path cost)}). If cpus is a queue of CPU numbers,
+    one is taken and the process is pinned to it while the trial runs.
+    """
+    cpu = None
+    if cpus is not None:
+        cpu = cpus.get()
+        os.sched_setaffinity(0, {cpu})
+    try:
+        size, (si, sj), (di, dj) = EXPERIMENTS[experiment]["query"](param)
+        graph, vertices = grid(size, size, seed=trial_seed(seed, experiment, param, index)).to_graph()
+        src = vertices[si * size + sj]
+        dest = vertices[di * size + dj]
+
+        results = {}
+        for engine in EXPERIMENTS[experiment]["engines"]:
+            #start each engine from the same clean heap, and keep the collector out of the timing
+            gc.collect()
+            gc.disable()
+            start = perf_counter()
+            paths = getattr(graph, engine)(src, dest)
+            end = perf_counter()
+            gc.enable()
+            results[engine] = (end - start, paths[dest][0])
+        return experiment, param, results
+    finally:
+        if cpu is not None:
+            cpus.put(cpu)
+
+def run(experiments, trials, jobs, seed, pin=False, sizes=None):
+    """ Run every trial of experiments in worker processes and return the aggregated report.
+
+    If jobs is None it is chosen by default_jobs. The report maps experiment -> param -> engine -> summary dict.
+    """
+    tasks = []
+    largest_size = 0
+    for experiment in experiments:
+        params = sizes if sizes and experiment != "q4" else EXPERIMENTS[experiment]["params"]
+        for param in params:
+            largest_size = max(largest_size, EXPERIMENTS[experiment]["query"](param)[0])
+            for index in range(trials):
+                tasks.append((experiment, param, index, seed))
+    if jobs is None:
+        jobs = default_jobs(largest_size)
+
+    collected = {}
+    with Manager() as manager:
+        cpus = None
+        if pin:
+            cpus = manager.Queue()
+            available = sorted(os.sched_getaffinity(0))
+            for cpu in available:
+                cpus.put(cpu)
+            jobs = min(jobs, len(available))
+
+        #maxtasksperchild=1 gives every trial a fresh process
+        with Pool(jobs, maxtasksperchild=1) as pool:
+            pending = [pool.apply_async(run_trial, task + (cpus,)) for task in tasks]
+            for result in pending:
+                experiment, param, results = result.get()
+                for engine, sample in results.items():
+                    collected.setdefault(experiment, {}).setdefault(param, {}).setdefault(engine, []).append(sample)
+
+    report = {}
+    for experiment, by_param in collected.items():
+        for param, by_engine in by_param.items():
+            for engine, samples in by_engine.items():
+                runtimes = [runtime for runtime, _ in samples]
+                report.setdefault(experiment, {}).setdefault(param, {})[engine] = {
+                    "trials": len(samples),
+                    "average_runtime": mean(runtimes),
+                    "stdev_runtime": stdev(runtimes) if len(runtimes) > 1 else 0.0,
+                    "average_path_cost": mean(cost for _, cost in samples),
+                    "runtimes": runtimes}
+    return report
+
+def print_report(report):
+    for experiment in report:
+        print("\n%s" % experiment)
+        for param, by_engine in report[experiment].items():
+            for engine, summary in by_engine.items():
+                print("%s: %s: %d, Average Path Cost: %d, Average Runtime: %0.3f (sd %0.3f, %d trials)"
+                      % (engine, "Destination" if experiment == "q4" else "Size", param,
+                         summary["average_path_cost"], summary["average_runtime"],
+                         summary["stdev_runtime"], summary["trials"]))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the evaluation experiments in parallel, one process per trial.")
+    parser.add_argument("experiments", nargs="*", help="experiments to run, from %s (default: all)" % ", ".join(sorted(EXPERIMENTS)))
+    parser.add_argument("--trials", type=int, default=10)
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="number of trials to run at once (default: up to %d, as memory allows)" % DEFAULT_JOBS)
+    parser.add_argument("--pin", action="store_true", help="pin each trial to its own CPU")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sizes", type=int, nargs="+", help="grid sizes to use instead of the defaults (not q4)")
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    args = parser.parse_args(argv)
+    for experiment in args.experiments:
+        if experiment not in EXPERIMENTS:
+            parser.error("unknown experiment %r" % experiment)
+    experiments = args.experiments or sorted(EXPERIMENTS)
+
+    start = perf_counter()
+    report = run(experiments, args.trials, args.jobs, args.seed, args.pin, args.sizes)
+    print_report(report)
+    print("\nCompleted in %0.1f s" % (perf_counter() - start))
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+#Local shortest path query server
+#
+#Usage:
+#  python server.py --grid 250 --port 8765
+#  python server.py --graph simplegraph1-2.txt --unix /tmp/paths.sock
+#  python server.py --grid 250 --table hubs.table    (see distance_table.py)
+#
+#The graph is loaded once in each worker process. Clients send one JSON object per line and get
+#one JSON object per line back:
+#  {"id": 1, "source": 1, "dest": 4}              point-to-point
+#  {"id": 2, "source": 1, "dests": [2, 3, 4]}     one-to-many
+#  {"id": 3, "op": "sample", "count": 10}          random vertex labels, for load generation
+#Each result is {"dest": label, "cost": cost, "path": [labels from source to dest]}, with cost and
+#path None if dest is unreachable.
+#
+#Requests with the same source that arrive within --batch-window of each other, or while the
+#workers are busy, are answered by a single search. Searches run in a pool of worker processes so
+#that the event loop stays responsive.
+
+import argparse
+import asyncio
+import json
+import os
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from evaluation import graphreader, grid_graph
+
+#--------------------------------------------------#
+#Worker process
+
+_graph = None
+_labels = None
+_workspace = None
+
+def load_graph(filename=None, grid=None, seed=0):
+    """ Load the graph from filename, or build a seeded grid x grid graph.
+
+    Return the graph and a dict mapping vertex labels to vertices.
+    """
+    if filename:
+        graph, vertices = graphreader(filename)
+    else:
+        random.seed(seed)
+        graph, mat = grid_graph(grid, grid)
+        vertices = {v.element(): v for row in mat for v in row}
+    return graph, vertices
+
+def init_worker(filename, grid, seed, tables=()):
+    global _graph, _labels, _workspace
+    _graph, _labels = load_graph(filename, grid, seed)
+    _workspace = _graph.workspace()
+    for table in tables:
+        _graph.load_distance_table(table)
+
+def search(source, dests):
+    """ Return a result dict for each label in dests, searching from the vertex labelled source.
+
+    Sources with a precomputed distance table are answered from the table. Otherwise a single
+    destination uses an early-exit search in the worker's reusable workspace, and several
+    destinations build the full shortest path tree.
+    """
+    src = _labels.get(source)
+    if src is None:
+        raise ValueError("unknown source %r" % (source,))
+    results = {}
+    targets = {}
+    for dest in dests:
+        if dest in _labels:
+            targets[dest] = _labels[dest]
+        else:
+            results[dest] = {"dest": dest, "error": "unknown dest %r" % (dest,)}
+    if not targets:
+        return results
+
+    table = _graph.distance_table(src)
+    if table:
+        for dest, v in targets.items():
+            path = table.path(src, v)
+            if path is not None:
+                path = [w.element() for w in path]
+            results[dest] = {"dest": dest, "cost": table.cost(src, v), "path": path}
+        return results
+
+    if len(targets) == 1:
+        dest, v = next(iter(targets.items()))
+        cost = _workspace.query(src, v)
+        path = _workspace.path(v)
+        if path is not None:
+            path = [w.element() for w in path]
+        results[dest] = {"dest": dest, "cost": cost, "path": path}
+        return results
+
+    closed = _graph.dijkstra_heap_v1(src, None)
+    for dest, v in targets.items():
+        if v not in closed:
+            results[dest] = {"dest": dest, "cost": None, "path": None}
+            continue
+        path = []
+        w = v
+        while w:
+            path.append(w.element())
+            w = closed[w][1]
+        path.reverse()
+        results[dest] = {"dest": dest, "cost": closed[v][0], "path": path}
+    return results
+
+def is_label(label):
+    """ Return True if label can be a vertex label (a JSON string or number). """
+    return isinstance(label, (str, int, float)) and not isinstance(label, bool)
+
+def sample(count, seed):
+    """ Return count random vertex labels. """
+    labels = list(_labels)
+    return random.Random(seed).sample(labels, min(count, len(labels)))
+
+#--------------------------------------------------#
+#Server
+
+class QueryServer:
+    """ Answer shortest path queries, batching concurrent requests that share a source.
+
+    A batch for a source stays open for batch_window seconds (or until it holds max_batch requests)
+    and is then queued for a worker. At most workers searches run at once, so while the pool is busy
+    queued batches keep collecting requests for their source instead of piling up in the executor.
+    """
+
+    def __init__(self, executor, workers, batch_window=0.002, max_batch=64):
+        self._executor = executor
+        self._workers = workers
+        self._batch_window = batch_window
+        self._max_batch = max_batch
+        self._pending = {}      #source -> list of (dests, future) not yet sent to a worker
+        self._timers = {}       #source -> TimerHandle closing the batch window
+        self._ready = deque()   #sources whose batch window has closed, in order
+        self._running = 0
+        self.searches = 0
+        self.requests = 0
+
+    async def query(self, source, dests):
+        """ Return the results for dests from source, sharing a search with other pending requests. """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if source not in self._pending:
+            self._pending[source] = []
+            self._timers[source] = loop.call_later(self._batch_window, self._close, source)
+        batch = self._pending[source]
+        batch.append((dests, future))
+        self.requests += 1
+
+        if len(batch) >= self._max_batch and source in self._timers:
+            self._close(source)
+        return await future
+
+    def _close(self, source):
+        """ Close the batch window for source and queue it for a worker. """
+        self._timers.pop(source).cancel()
+        self._ready.append(source)
+        self._dispatch()
+
+    def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while self._ready and self._running < self._workers:
+            source = self._ready.popleft()
+            batch = self._pending.pop(source)
+            try:
+                dests = list(dict.fromkeys(dest for request_dests, _ in batch for dest in request_dests))
+                search_future = loop.run_in_executor(self._executor, search, source, dests)
+            except Exception as e:
+                #this runs in a loop callback, so the error must go to the waiting requests
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self._running += 1
+            self.searches += 1
+            search_future.add_done_callback(lambda f, batch=batch: self._resolve(batch, f))
+
+    def _resolve(self, batch, search_future):
+        self._running -= 1
+        error = search_future.exception()
+        for dests, future in batch:
+            if future.cancelled():
+                continue
+            if error:
+                future.set_exception(error)
+            else:
+                results = search_future.result()
+                future.set_result([results[dest] for dest in dests])
+        self._dispatch()
+
+    async def handle(self, request):
+        """ Return the response dict for the request dict. """
+        response = {"id": request.get("id")}
+        try:
+            op = request.get("op", "query")
+            if op == "sample":
+                loop = asyncio.get_running_loop()
+                response["labels"] = await loop.run_in_executor(
+                    self._executor, sample, request.get("count", 1), request.get("seed"))
+            elif op == "stats":
+                response["requests"] = self.requests
+                response["searches"] = self.searches
+            elif op == "query":
+                if "dests" in request:
+                    dests = request["dests"]
+                    if not isinstance(dests, list):
+                        raise ValueError("dests must be a list of vertex labels")
+                else:
+                    dests = [request["dest"]]
+                for label in [request["source"]] + dests:
+                    if not is_label(label):
+                        raise ValueError("invalid vertex label %r" % (label,))
+                response["results"] = await self.query(request["source"], dests)
+            else:
+                raise ValueError("unknown op %r" % (op,))
+        except (KeyError, ValueError, TypeError) as e:
+            response["error"] = str(e)
+        return response
+
+    async def serve_connection(self, reader, writer):
+        """ Answer every request on a connection; responses are written as they complete. """
+        tasks = set()
+
+        async def respond(line):
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                response = {"id": None, "error": "invalid JSON: %s" % e}
+            else:
+                if not isinstance(request, dict):
+                    response = {"id": None, "error": "request must be a JSON object"}
+                else:
+                    try:
+                        response = await self.handle(request)
+                    except Exception as e:
+                        #e.g. a broken worker pool; the client still gets an answer
+                        response = {"id": request.get("id"), "error": "%s: %s" % (type(e).__name__, e)}
+            writer.write((json.dumps(response) + "\n").encode())
+            await writer.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.ensure_future(respond(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+def check_tables(args):
+    """ Open each --table against the graph once, so a bad table stops the server before it starts. """
+    graph, _ = load_graph(args.graph, args.grid, args.seed)
+    for filename in args.table:
+        try:
+            graph.load_distance_table(filename)
+        except (OSError, ValueError) as e:
+            raise SystemExit("%s: %s" % (filename, e))
+
+async def serve(args):
+    if args.table:
+        check_tables(args)
+    workers = args.workers or os.cpu_count()
+    with ProcessPoolExecutor(workers, initializer=init_worker,
+                             initargs=(args.graph, args.grid, args.seed, args.table)) as executor:
+        server = QueryServer(executor, workers, args.batch_window / 1000, args.max_batch)
+        if args.unix:
+            listener = await asyncio.start_unix_server(server.serve_connection, path=args.unix)
+            where = args.unix
+        else:
+            listener = await asyncio.start_server(server.serve_connection, args.host, args.port)
+            where = "%s:%d" % (args.host, args.port)
+        print("Serving on %s with %d workers" % (where, workers))
+        async with listener:
+            await listener.serve_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve shortest path queries over a local socket.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--graph", help="graph file in the format read by evaluation.graphreader")
+    source.add_argument("--grid", type=int, help="serve a seeded grid graph of this size")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the grid graph weights")
+    parser.add_argument("--table", action="append", default=[],
+                        help="precomputed distance table to answer queries from (may be repeated)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: one per CPU)")
+    parser.add_argument("--batch-window", type=float, default=2.0,
+                        help="milliseconds to wait for more requests with the same source")
+    parser.add_argument("--max-batch", type=int, default=64)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
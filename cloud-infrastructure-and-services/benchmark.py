@@ -0,0 +1,346 @@
+#Benchmark runner for comparing MatrixMultiplication.py across environments (host, VM, Docker)
+#
+#Usage:
+#  python benchmark.py run --label host --output host.json
+#  python benchmark.py compare host.json vm.json docker.json
+#  python benchmark.py run --workload outofcore --limits 256 512 --directory /mnt/scratch --output host-io.json
+#
+#The workload is the same as MatrixMultiplication.py, but the time spent generating the random
+#input matrices and the time spent multiplying them are recorded separately, each limit is run
+#several times after some warmup runs, and the results are written to a JSON file together with
+#a description of the environment they were recorded in.
+#
+#The outofcore workload (see out_of_core.py) multiplies square matrices stored in memory-mapped
+#files instead, and splits its time into I/O and compute; its inputs are generated once per size.
+
+import argparse
+import json
+import os
+import platform
+import sys
+from random import Random
+from statistics import mean, stdev, NormalDist
+from time import perf_counter, strftime
+
+from out_of_core import OutOfCoreWorkload
+
+LIMITS = [2, 10, 100, 150, 1000, 5000]
+
+OUT_OF_CORE_SIZES = [64, 128, 256, 512]
+
+PHASE_NAMES = {"generation": "Generation", "io": "I/O", "compute": "Compute"}
+
+FORMAT_VERSION = 1
+
+#--------------------------------------------------#
+#Workload
+
+def run_limit(limit, rng):
+    """ Run the MatrixMultiplication.py workload for one limit.
+
+    Return a dict with the generation time and compute time in seconds.
+    """
+    generation_time = 0
+    compute_time = 0
+
+    for n in range(2, limit+1):
+        start = perf_counter()
+
+        matrix_a = [None] * n
+        matrix_b = [None] * n
+        for i in range(n):
+            matrix_a[i] = [None] * 2
+            matrix_b[i] = [None] * 2
+            for j in range(2):
+                matrix_a[i][j] = rng.randint(1, 10)
+                matrix_b[i][j] = rng.randint(1, 10)
+
+        middle = perf_counter()
+
+        result = [None] * n
+        for i in range(n):
+            result[i] = [0] * 2
+
+        for i in range(n):
+            for j in range(2):
+                result[i][j] = (matrix_a[i][0] * matrix_b[0][j] + matrix_a[i][1] * matrix_b[1][j])
+
+        end = perf_counter()
+
+        generation_time += middle - start
+        compute_time += end - middle
+
+    return {"generation": generation_time, "compute": compute_time}
+
+def run_benchmark(limits, repeats, warmup, seed, workload=run_limit):
+    """ Run every limit warmup + repeats times and return the recorded (non-warmup) runs.
+
+    workload(limit, rng) returns a dict of phase name to seconds. If the workload has a setup
+    method, it is called once per limit before the runs and its time is recorded as "setup".
+    """
+    setup = getattr(workload, "setup", None)
+    cleanup = getattr(workload, "cleanup", None)
+
+    results = []
+    for limit in limits:
+        rng = Random(seed)
+        result = {"limit": limit}
+        if setup:
+            result["setup"] = setup(limit, rng)
+
+        for _ in range(warmup):
+            workload(limit, rng)
+
+        phases = {}
+        for _ in range(repeats):
+            for phase, seconds in workload(limit, rng).items():
+                phases.setdefault(phase, []).append(seconds)
+        if cleanup:
+            cleanup(limit)
+
+        result.update(phases)
+        result["total"] = [sum(run) for run in zip(*phases.values())]
+        results.append(result)
+
+        print("Limit: %d, %s (mean of %d runs)"
+              % (limit, ", ".join("%s: %0.4f" % (PHASE_NAMES[phase], mean(phases[phase])) for phase in phases), repeats))
+    return results
+
+#--------------------------------------------------#
+#Environment metadata
+
+def read_file(path):
+    """ Return the stripped contents of path, or None if it cannot be read. """
+    try:
+        with open(path, 'r') as file:
+            return file.read().strip()
+    except OSError:
+        return None
+
+def cpu_model():
+    """ Return the CPU model name from /proc/cpuinfo. """
+    cpuinfo = read_file("/proc/cpuinfo")
+    if cpuinfo:
+        for line in cpuinfo.splitlines():
+            if line.startswith("model name"):
+                return line.split(":", 1)[1].strip()
+    return platform.processor() or None
+
+def cgroup_limits():
+    """ Return the CPU and memory limits imposed by the cgroup, if any.
+
+    The CPU limit is given as a number of CPUs (quota / period) and the memory limit in bytes.
+    None means no limit (or that the limit could not be read).
+    """
+    cpu_limit = None
+    memory_limit = None
+
+    #cgroup v2
+    cpu_max = read_file("/sys/fs/cgroup/cpu.max")
+    if cpu_max:
+        quota, period = cpu_max.split()
+        if quota != "max":
+            cpu_limit = int(quota) / int(period)
+    memory_max = read_file("/sys/fs/cgroup/memory.max")
+    if memory_max and memory_max != "max":
+        memory_limit = int(memory_max)
+
+    #cgroup v1
+    if cpu_max is None:
+        quota = read_file("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+        period = read_file("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+        if quota and period and int(quota) > 0:
+            cpu_limit = int(quota) / int(period)
+    if memory_max is None:
+        limit = read_file("/sys/fs/cgroup/memory/memory.limit_in_bytes")
+        #v1 reports a huge page-aligned number when there is no limit
+        if limit and int(limit) < 2**60:
+            memory_limit = int(limit)
+
+    return cpu_limit, memory_limit
+
+def detect_virtualization():
+    """ Return True if the CPU reports that it is running under a hypervisor. """
+    cpuinfo = read_file("/proc/cpuinfo")
+    if cpuinfo:
+        for line in cpuinfo.splitlines():
+            if line.startswith("flags"):
+                return "hypervisor" in line.split()
+    return False
+
+def detect_container():
+    """ Return the name of the container runtime we are running in, or None. """
+    if os.path.exists("/.dockerenv"):
+        return "docker"
+    if os.path.exists("/run/.containerenv"):
+        return "podman"
+    cgroup = read_file("/proc/1/cgroup") or ""
+    for runtime in ("docker", "kubepods", "containerd", "lxc"):
+        if runtime in cgroup:
+            return runtime
+    return None
+
+def environment():
+    """ Return a dict describing the environment the benchmark is running in. """
+    cpu_limit, memory_limit = cgroup_limits()
+    if hasattr(os, "sched_getaffinity"):
+        usable_cpus = len(os.sched_getaffinity(0))
+    else:
+        usable_cpus = os.cpu_count()
+    return {"hostname": platform.node(),
+            "platform": platform.platform(),
+            "cpu_model": cpu_model(),
+            "cpu_count": os.cpu_count(),
+            "usable_cpus": usable_cpus,
+            "cgroup_cpu_limit": cpu_limit,
+            "cgroup_memory_limit": memory_limit,
+            "python_version": platform.python_version(),
+            "python_implementation": platform.python_implementation(),
+            "virtualized": detect_virtualization(),
+            "container": detect_container()}
+
+#--------------------------------------------------#
+#Statistics
+
+#Two-sided Student t critical values for 1 to 30 degrees of freedom, by confidence level
+T_TABLE = {
+    0.90: (6.314, 2.920, 2.353, 2.132, 2.015, 1.943, 1.895, 1.860, 1.833, 1.812,
+           1.796, 1.782, 1.771, 1.761, 1.753, 1.746, 1.740, 1.734, 1.729, 1.725,
+           1.721, 1.717, 1.714, 1.711, 1.708, 1.706, 1.703, 1.701, 1.699, 1.697),
+    0.95: (12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+           2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+           2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042),
+    0.99: (63.657, 9.925, 5.841, 4.604, 4.032, 3.707, 3.499, 3.355, 3.250, 3.169,
+           3.106, 3.055, 3.012, 2.977, 2.947, 2.921, 2.898, 2.878, 2.861, 2.845,
+           2.831, 2.819, 2.807, 2.797, 2.787, 2.779, 2.771, 2.763, 2.756, 2.750),
+}
+
+def t_critical(df, level=0.95):
+    """ Return the two-sided Student t critical value for df degrees of freedom.
+
+    Small df are looked up in T_TABLE; above 30 the Cornish-Fisher expansion around the normal value
+    is accurate to about 0.001.
+    """
+    if df <= len(T_TABLE[0.95]):
+        if level not in T_TABLE:
+            raise ValueError("no t table for level %s with %d degrees of freedom" % (level, df))
+        return T_TABLE[level][df - 1]
+    z = NormalDist().inv_cdf(0.5 + level / 2)
+    return z + (z**3 + z) / (4 * df) + (5 * z**5 + 16 * z**3 + 3 * z) / (96 * df**2)
+
+def confidence_interval(samples, level=0.95):
+    """ Return a (low, high) Student t confidence interval for the mean of samples. """
+    m = mean(samples)
+    if len(samples) < 2:
+        return m, m
+    half = t_critical(len(samples) - 1, level) * stdev(samples) / len(samples) ** 0.5
+    return m - half, m + half
+
+def ratio_interval(baseline, other, level=0.95, resamples=2000, seed=0):
+    """ Return (ratio, low, high) for mean(baseline) / mean(other).
+
+    The interval is a percentile bootstrap, so a ratio above 1 means other is faster than the baseline.
+    """
+    ratio = mean(baseline) / mean(other)
+    rng = Random(seed)
+    ratios = []
+    for _ in range(resamples):
+        b = rng.choices(baseline, k=len(baseline))
+        o = rng.choices(other, k=len(other))
+        ratios.append(mean(b) / mean(o))
+    ratios.sort()
+    low = ratios[int((1 - level) / 2 * resamples)]
+    high = ratios[min(resamples - 1, int((1 + level) / 2 * resamples))]
+    return ratio, low, high
+
+#--------------------------------------------------#
+#Commands
+
+def run(args):
+    if args.workload == "outofcore":
+        workload = OutOfCoreWorkload(args.directory, args.block, args.cold_cache)
+    else:
+        workload = run_limit
+    results = run_benchmark(args.limits, args.repeats, args.warmup, args.seed, workload)
+    report = {"format_version": FORMAT_VERSION,
+              "label": args.label,
+              "timestamp": strftime("%Y-%m-%dT%H:%M:%S%z"),
+              "workload": args.workload,
+              "repeats": args.repeats,
+              "warmup": args.warmup,
+              "seed": args.seed,
+              "environment": environment(),
+              "results": results}
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print("Results written to %s" % args.output)
+
+def compare(args):
+    reports = []
+    for filename in args.files:
+        with open(filename, 'r') as file:
+            reports.append(json.load(file))
+
+    baseline = reports[0]
+    for filename, report in zip(args.files[1:], reports[1:]):
+        for key in ("format_version", "workload"):
+            if report.get(key) != baseline.get(key):
+                raise SystemExit("cannot compare %s (%s %s) with %s (%s %s)"
+                                 % (filename, key, report.get(key), args.files[0], key, baseline.get(key)))
+    base_results = {r["limit"]: r for r in baseline["results"]}
+
+    for report in reports:
+        env = report["environment"]
+        print("%s: %s, %s CPUs, Python %s, virtualized: %s, container: %s"
+              % (report["label"], env["cpu_model"], env["usable_cpus"], env["python_version"],
+                 env["virtualized"], env["container"]))
+
+    for report in reports[1:]:
+        print("\nSpeedup of %s relative to %s (%s phase, >1 means %s is faster)"
+              % (report["label"], baseline["label"], args.phase, report["label"]))
+        for result in report["results"]:
+            limit = result["limit"]
+            if limit not in base_results or args.phase not in result or args.phase not in base_results[limit]:
+                continue
+            base_samples = base_results[limit][args.phase]
+            samples = result[args.phase]
+            ratio, low, high = ratio_interval(base_samples, samples)
+            base_low, base_high = confidence_interval(base_samples)
+            low_other, high_other = confidence_interval(samples)
+            print("Limit: %d, %s: %0.4f [%0.4f, %0.4f], %s: %0.4f [%0.4f, %0.4f], Speedup: %0.3f [%0.3f, %0.3f]"
+                  % (limit, baseline["label"], mean(base_samples), base_low, base_high,
+                     report["label"], mean(samples), low_other, high_other, ratio, low, high))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the matrix multiplication workload across environments.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmark and write the results to a JSON file")
+    run_parser.add_argument("--label", default=platform.node(), help="name for this environment (e.g. host, vm, docker)")
+    run_parser.add_argument("--output", default="results.json")
+    run_parser.add_argument("--workload", choices=("matrix", "outofcore"), default="matrix")
+    run_parser.add_argument("--limits", type=int, nargs="+", default=None,
+                            help="limits for the matrix workload, or matrix sizes for the outofcore workload")
+    run_parser.add_argument("--repeats", type=int, default=10)
+    run_parser.add_argument("--warmup", type=int, default=2)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--directory", default="matrices", help="where the outofcore workload keeps its matrix files")
+    run_parser.add_argument("--block", type=int, default=256, help="block size for the outofcore workload")
+    run_parser.add_argument("--cold-cache", action="store_true",
+                            help="evict the outofcore input files from the page cache before every run")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser("compare", help="compare result files; the first file is the baseline")
+    compare_parser.add_argument("files", nargs="+")
+    compare_parser.add_argument("--phase", choices=("generation", "io", "compute", "total"), default="compute")
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+    if args.command == "run" and args.limits is None:
+        args.limits = OUT_OF_CORE_SIZES if args.workload == "outofcore" else LIMITS
+    if args.command == "compare" and len(args.files) < 2:
+        parser.error("compare needs at least two result files")
+    args.func(args)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,170 @@
+#Out-of-core matrix multiplication over memory-mapped files
+#
+#The input matrices are generated to disk once, as raw native-endian 64-bit integers in row-major
+#order, and then multiplied block by block into a memory-mapped output file. Only one block of
+#each matrix is held as Python objects at a time, so the size of matrix that can be tested is
+#limited by the disk rather than by interpreter object overhead, and the time spent moving data
+#between the files and Python (I/O) is reported separately from the time spent multiplying (compute).
+
+import mmap
+import os
+from array import array
+from random import Random
+from time import perf_counter
+
+ITEMSIZE = array('q').itemsize
+
+def generate_matrix(filename, n, rng, low=1, high=10):
+    """ Write an n x n matrix of random integers in [low, high] to filename. """
+    with open(filename, 'wb') as file:
+        for _ in range(n):
+            array('q', [rng.randint(low, high) for _ in range(n)]).tofile(file)
+
+def drop_cache(filename):
+    """ Ask the kernel to evict filename from the page cache, so that the next reads go to storage. """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    fd = os.open(filename, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+def map_matrix(filename, n, writable=False):
+    """ Memory-map the n x n matrix in filename and return (file, mmap, memoryview of int64). """
+    if writable:
+        file = open(filename, 'w+b')
+        file.truncate(n * n * ITEMSIZE)
+        mapped = mmap.mmap(file.fileno(), 0)
+    else:
+        file = open(filename, 'rb')
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return file, mapped, memoryview(mapped).cast('q')
+
+def read_block(view, n, row, col, rows, cols):
+    """ Return the rows x cols block at (row, col) of the mapped matrix as a list of lists. """
+    return [view[i*n + col : i*n + col + cols].tolist() for i in range(row, row + rows)]
+
+def write_block(view, n, row, col, block):
+    """ Write block (a list of lists) into the mapped matrix at (row, col). """
+    for offset, values in enumerate(block):
+        start = (row + offset) * n + col
+        view[start : start + len(values)] = array('q', values)
+
+def multiply(a_filename, b_filename, c_filename, n, block=256):
+    """ Multiply the n x n matrices in a_filename and b_filename into c_filename.
+
+    Return a dict with the time in seconds spent on I/O (reading and writing blocks, and flushing
+    the output to disk) and on compute (multiplying blocks).
+    """
+    io_time = 0
+    compute_time = 0
+
+    start = perf_counter()
+    a_file, a_map, a = map_matrix(a_filename, n)
+    b_file, b_map, b = map_matrix(b_filename, n)
+    c_file, c_map, c = map_matrix(c_filename, n, writable=True)
+    io_time += perf_counter() - start
+
+    try:
+        for i0 in range(0, n, block):
+            rows = min(block, n - i0)
+            for j0 in range(0, n, block):
+                cols = min(block, n - j0)
+                result = [[0] * cols for _ in range(rows)]
+
+                for k0 in range(0, n, block):
+                    depth = min(block, n - k0)
+
+                    start = perf_counter()
+                    a_block = read_block(a, n, i0, k0, rows, depth)
+                    b_block = read_block(b, n, k0, j0, depth, cols)
+                    middle = perf_counter()
+
+                    for i in range(rows):
+                        a_row = a_block[i]
+                        result_row = result[i]
+                        for k in range(depth):
+                            a_ik = a_row[k]
+                            b_row = b_block[k]
+                            for j in range(cols):
+                                result_row[j] += a_ik * b_row[j]
+
+                    end = perf_counter()
+                    io_time += middle - start
+                    compute_time += end - middle
+
+                start = perf_counter()
+                write_block(c, n, i0, j0, result)
+                io_time += perf_counter() - start
+
+        start = perf_counter()
+        c_map.flush()
+        io_time += perf_counter() - start
+    finally:
+        #The memoryviews must be released before the maps can be closed
+        for view, mapped, file in ((a, a_map, a_file), (b, b_map, b_file), (c, c_map, c_file)):
+            view.release()
+            mapped.close()
+            file.close()
+
+    return {"io": io_time, "compute": compute_time}
+
+class OutOfCoreWorkload:
+    """ Benchmark workload multiplying size x size matrices stored in directory.
+
+    setup() generates the inputs for a size once; each call then runs one multiplication.
+    """
+
+    def __init__(self, directory, block=256, cold_cache=False):
+        self._directory = directory
+        self._block = block
+        self._cold_cache = cold_cache
+
+    def _filenames(self, size):
+        return [os.path.join(self._directory, "%s_%d.bin" % (name, size)) for name in ("a", "b", "c")]
+
+    def setup(self, size, rng):
+        """ Generate the input matrices for size and return the time taken. """
+        os.makedirs(self._directory, exist_ok=True)
+        a_filename, b_filename, _ = self._filenames(size)
+        start = perf_counter()
+        generate_matrix(a_filename, size, rng)
+        generate_matrix(b_filename, size, rng)
+        return perf_counter() - start
+
+    def __call__(self, size, rng):
+        a_filename, b_filename, c_filename = self._filenames(size)
+        if self._cold_cache:
+            drop_cache(a_filename)
+            drop_cache(b_filename)
+        return multiply(a_filename, b_filename, c_filename, size, self._block)
+
+    def cleanup(self, size):
+        """ Remove the files for size. """
+        for filename in self._filenames(size):
+            if os.path.exists(filename):
+                os.remove(filename)
+
+if __name__ == "__main__":
+    #Check the blocked result against a straightforward in-memory multiplication
+    import tempfile
+
+    n = 37
+    with tempfile.TemporaryDirectory() as directory:
+        workload = OutOfCoreWorkload(directory, block=8)
+        workload.setup(n, Random(0))
+        times = workload(n, None)
+
+        a_filename, b_filename, c_filename = workload._filenames(n)
+        matrices = []
+        for filename in (a_filename, b_filename, c_filename):
+            with open(filename, 'rb') as file:
+                values = array('q')
+                values.fromfile(file, n * n)
+            matrices.append([values[i*n:(i+1)*n].tolist() for i in range(n)])
+        a, b, c = matrices
+
+        expected = [[sum(a[i][k] * b[k][j] for k in range(n)) for j in range(n)] for i in range(n)]
+        print("Correct: %s, I/O: %0.4f, Compute: %0.4f" % (c == expected, times["io"], times["compute"]))